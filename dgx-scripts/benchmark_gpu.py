@@ -1,47 +1,71 @@
 #!/usr/bin/env python3
 """Benchmark whisper models on GPU"""
-import whisper
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+import hashlib
 import time
 import requests
-import tempfile
 import os
+from pathlib import Path
+
+CACHE_DIR = Path("/tmp/bench_cache")
 
-print("Downloading test audio (~30MB)...")
 url = "https://sphinx.acast.com/p/acast/s/dungeons-and-daddies/e/6940b888891c3619dc4b3b3e/media.mp3"
-with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-    headers = {"User-Agent": "Mozilla/5.0"}
-    resp = requests.get(url, headers=headers, stream=True, timeout=60)
-    total = 0
-    for chunk in resp.iter_content(8192):
-        f.write(chunk)
-        total += len(chunk)
-        if total > 30 * 1024 * 1024:
-            break
-    audio_path = f.name
-print(f"Downloaded {total/1024/1024:.1f}MB (~10 min audio)")
+# Keep the truncated download between runs, keyed by URL
+audio_path = CACHE_DIR / f"{hashlib.sha1(url.encode()).hexdigest()}_30mb.mp3"
+if audio_path.exists():
+    print(f"Using cached test audio: {audio_path}")
+else:
+    print("Downloading test audio (~30MB)...")
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary name so an interrupted download is never reused
+    partial_path = audio_path.with_suffix(".part")
+    # Ask the server for the first 30MB only, then stream it to disk in 1MB reads.
+    # The copy is capped too, in case the server ignores Range and sends the whole episode.
+    limit = 30 * 1024 * 1024
+    headers = {"User-Agent": "Mozilla/5.0", "Range": f"bytes=0-{limit - 1}"}
+    with requests.get(url, headers=headers, stream=True, timeout=60) as resp, \
+            open(partial_path, "wb") as f:
+        resp.raise_for_status()
+        resp.raw.decode_content = True
+        while f.tell() < limit:
+            chunk = resp.raw.read(min(1024 * 1024, limit - f.tell()))
+            if not chunk:
+                break
+            f.write(chunk)
+    partial_path.rename(audio_path)
+audio_path = str(audio_path)
+total = os.path.getsize(audio_path)
+print(f"Test audio: {total/1024/1024:.1f}MB (~10 min audio)")
 
 print("\n" + "=" * 50)
-print("WHISPER GPU BENCHMARK (CUDA 13.1)")
+print("WHISPER GPU BENCHMARK (CUDA 13.1, int8_float16)")
 print("=" * 50)
 
 results = []
 for model_name in ["tiny", "base", "small"]:
     print(f"\nLoading {model_name}...", end=" ", flush=True)
-    model = whisper.load_model(model_name, device="cuda")
+    # INT8 weights with FP16 activations halve memory traffic on the matmuls
+    model = WhisperModel(model_name, device="cuda", compute_type="int8_float16")
+    # Decode VAD-split speech chunks as padded batches instead of one window at a time
+    pipeline = BatchedInferencePipeline(model=model)
     print("transcribing...", end=" ", flush=True)
 
     start = time.time()
-    result = model.transcribe(audio_path, language="en")
+    segments, info = pipeline.transcribe(
+        audio_path, language="en", beam_size=1, vad_filter=True, batch_size=16,
+        # Timestamp tokens keep segments sentence-level, so the segment count stays comparable
+        without_timestamps=False
+    )
+    # Segments are generated lazily, so materialize them inside the timed block
+    segments = list(segments)
     elapsed = time.time() - start
 
-    num_segs = len(result["segments"])
+    num_segs = len(segments)
     print(f"done!")
     print(f"  Time: {elapsed:.1f}s")
     print(f"  Segments: {num_segs}")
     results.append((model_name, elapsed, num_segs))
 
-os.unlink(audio_path)
-
 print("\n" + "=" * 50)
 print("SUMMARY")
 print("=" * 50)
@@ -6,15 +6,22 @@ Tests various Whisper and Ollama model combinations to find
 the best balance of speed and quality.
 """
 
+import hashlib
 import json
+import multiprocessing
 import os
+import shutil
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
+import torch
+
 # Add parent dir for imports
 sys.path.insert(0, str(Path(__file__).parent))
-from process_podcast import process_podcast, transcribe_audio, identify_ads_with_ollama
+from process_podcast import process_podcast, load_audio, transcribe_audio, identify_ads_with_ollama
 
 # Test configurations
 WHISPER_MODELS = ["tiny", "base", "small", "medium", "large-v3"]
@@ -41,30 +48,96 @@ OLLAMA_MODELS = [
 # ~92 min episode, hosted on Acast (likely has ad reads)
 SAMPLE_URL = "https://sphinx.acast.com/p/acast/s/dungeons-and-daddies/e/6940b888891c3619dc4b3b3e/media.mp3"
 
+# Downloaded sample audio is kept here between runs, keyed by URL hash
+CACHE_DIR = Path("/tmp/bench_cache")
+
+
+def _visible_gpus() -> list[str]:
+    """GPU ids this process may use, honoring an existing CUDA_VISIBLE_DEVICES mask."""
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible is not None:
+        return [gpu for gpu in (g.strip() for g in visible.split(",")) if gpu]
+    return [str(i) for i in range(torch.cuda.device_count())]
+
+
+def _pin_worker_to_gpu(gpu_ids) -> None:
+    """Give this worker process its own GPU before CUDA is initialized."""
+    gpu_id = gpu_ids.get()
+    # None means no GPUs: leave the inherited environment alone
+    if gpu_id is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = gpu_id
+
+
+def _timed_transcription(pcm_path: str, model: str) -> tuple[float, list[dict]]:
+    """Transcribe pre-decoded audio in a worker process and return (elapsed seconds, transcript)."""
+    audio = np.load(pcm_path)
+    start = time.time()
+    transcript = transcribe_audio(audio, model)
+    return time.time() - start, transcript
+
+
+def decode_sample_audio(audio_path: str) -> str:
+    """
+    Decode audio to a 16kHz PCM .npy file next to it, reusing an existing one.
+    Every Whisper model then loads the same waveform instead of re-running ffmpeg.
+    """
+    pcm_path = Path(audio_path).with_suffix(".npy")
+    if not pcm_path.exists():
+        print(f"\nDecoding sample audio to {pcm_path}")
+        # Distinct from download_sample_audio's "<sha1>.part" for the MP3
+        partial_path = pcm_path.with_name(pcm_path.name + ".part")
+        with open(partial_path, "wb") as f:
+            np.save(f, load_audio(audio_path))
+        partial_path.rename(pcm_path)
+    return str(pcm_path)
+
 
 def benchmark_transcription(audio_path: str) -> dict:
-    """Benchmark Whisper model transcription times."""
+    """
+    Benchmark Whisper model transcription times.
+    Models are independent, so they run concurrently with one worker per GPU.
+    Successful results include the transcript so callers can reuse it.
+    """
     results = {}
-
-    for model in WHISPER_MODELS:
-        print(f"\nTesting Whisper model: {model}")
-        start = time.time()
-        try:
-            transcript = transcribe_audio(audio_path, model)
-            elapsed = time.time() - start
-            results[model] = {
-                "time": elapsed,
-                "segments": len(transcript),
-                "status": "success"
-            }
-            print(f"  {model}: {elapsed:.1f}s ({len(transcript)} segments)")
-        except Exception as e:
-            results[model] = {
-                "time": 0,
-                "status": "error",
-                "error": str(e)
-            }
-            print(f"  {model}: ERROR - {e}")
+    pcm_path = decode_sample_audio(audio_path)
+
+    # Spawn (not fork) so each worker initializes CUDA against its own device
+    gpus = _visible_gpus() or [None]
+    num_workers = len(gpus)
+    ctx = multiprocessing.get_context("spawn")
+    gpu_ids = ctx.Queue()
+    for gpu_id in gpus:
+        gpu_ids.put(gpu_id)
+
+    print(f"\nTesting {len(WHISPER_MODELS)} Whisper models across {num_workers} worker(s)")
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=ctx,
+        initializer=_pin_worker_to_gpu,
+        initargs=(gpu_ids,)
+    ) as executor:
+        futures = {
+            model: executor.submit(_timed_transcription, pcm_path, model)
+            for model in WHISPER_MODELS
+        }
+
+        for model, future in futures.items():
+            try:
+                elapsed, transcript = future.result()
+                results[model] = {
+                    "time": elapsed,
+                    "segments": len(transcript),
+                    "transcript": transcript,
+                    "status": "success"
+                }
+                print(f"  {model}: {elapsed:.1f}s ({len(transcript)} segments)")
+            except Exception as e:
+                results[model] = {
+                    "time": 0,
+                    "status": "error",
+                    "error": str(e)
+                }
+                print(f"  {model}: ERROR - {e}")
 
     return results
 
@@ -97,11 +170,32 @@ def benchmark_ad_detection(transcript: list[dict]) -> dict:
     return results
 
 
-def run_full_benchmark(audio_url: str) -> dict:
-    """Run complete benchmark of all model combinations."""
-    import tempfile
+def download_sample_audio(audio_url: str) -> str:
+    """Download sample audio once and reuse the cached copy on later runs."""
     import requests
 
+    audio_path = CACHE_DIR / f"{hashlib.sha1(audio_url.encode()).hexdigest()}.mp3"
+    if audio_path.exists():
+        print(f"\nUsing cached sample audio: {audio_path}")
+        return str(audio_path)
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary name so an interrupted download is never reused
+    partial_path = audio_path.with_suffix(".part")
+    print(f"\nDownloading sample audio...")
+    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'}
+    with requests.get(audio_url, stream=True, timeout=300, headers=headers) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with open(partial_path, "wb") as f:
+            shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+    partial_path.rename(audio_path)
+    print(f"Downloaded to: {audio_path}")
+    return str(audio_path)
+
+
+def run_full_benchmark(audio_url: str) -> dict:
+    """Run complete benchmark of all model combinations."""
     print("="*60)
     print("PODCAST AD REMOVAL BENCHMARK")
     print("="*60)
@@ -113,78 +207,70 @@ def run_full_benchmark(audio_url: str) -> dict:
         "full_pipeline": {}
     }
 
-    # Download sample audio first
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp:
-        print(f"\nDownloading sample audio...")
-        headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'}
-        response = requests.get(audio_url, stream=True, timeout=300, headers=headers)
-        for chunk in response.iter_content(chunk_size=8192):
-            tmp.write(chunk)
-        audio_path = tmp.name
-        print(f"Downloaded to: {audio_path}")
-
-    try:
-        # Benchmark Whisper models
-        print("\n" + "-"*40)
-        print("WHISPER TRANSCRIPTION BENCHMARKS")
-        print("-"*40)
-        results["whisper_benchmarks"] = benchmark_transcription(audio_path)
-
-        # Use best whisper model for Ollama benchmarks
-        best_whisper = min(
-            [(k, v) for k, v in results["whisper_benchmarks"].items() if v.get("status") == "success"],
-            key=lambda x: x[1]["time"]
-        )[0]
-        print(f"\nUsing {best_whisper} for Ollama benchmarks (fastest)")
-
-        # Get transcript with best model
-        transcript = transcribe_audio(audio_path, best_whisper)
-
-        # Benchmark Ollama models
-        print("\n" + "-"*40)
-        print("OLLAMA AD DETECTION BENCHMARKS")
-        print("-"*40)
-        results["ollama_benchmarks"] = benchmark_ad_detection(transcript)
-
-        # Full pipeline test with recommended config
-        print("\n" + "-"*40)
-        print("FULL PIPELINE TEST")
-        print("-"*40)
-
-        # Test with small+hermes3:8b (fast) and base+llama3.1:70b (quality)
-        configs = [
-            ("tiny", "hermes3:8b", "fast"),
-            ("base", "llama3.1:70b", "quality"),
-        ]
-
-        for whisper, ollama, label in configs:
-            print(f"\nTesting {label} config: whisper={whisper}, ollama={ollama}")
-            output_path = f"/tmp/benchmark_{label}_output.mp3"
-            start = time.time()
-            try:
-                stats = process_podcast(
-                    audio_source=audio_path,
-                    output_path=output_path,
-                    whisper_model=whisper,
-                    ollama_model=ollama
-                )
-                results["full_pipeline"][label] = {
-                    "config": {"whisper": whisper, "ollama": ollama},
-                    "total_time": stats["timings"]["total"],
-                    "timings": stats["timings"],
-                    "ads_found": len(stats["ad_segments"]),
-                    "status": "success"
-                }
-            except Exception as e:
-                results["full_pipeline"][label] = {
-                    "config": {"whisper": whisper, "ollama": ollama},
-                    "status": "error",
-                    "error": str(e)
-                }
-
-    finally:
-        # Cleanup
-        os.unlink(audio_path)
+    audio_path = download_sample_audio(audio_url)
+
+    # Benchmark Whisper models
+    print("\n" + "-"*40)
+    print("WHISPER TRANSCRIPTION BENCHMARKS")
+    print("-"*40)
+    results["whisper_benchmarks"] = benchmark_transcription(audio_path)
+
+    # Use best whisper model for Ollama benchmarks
+    best_whisper = min(
+        [(k, v) for k, v in results["whisper_benchmarks"].items() if v.get("status") == "success"],
+        key=lambda x: x[1]["time"]
+    )[0]
+    print(f"\nUsing {best_whisper} for Ollama benchmarks (fastest)")
+
+    # Reuse the transcript from the benchmark run; keep transcripts out of the JSON results
+    transcripts = {
+        model: data.pop("transcript")
+        for model, data in results["whisper_benchmarks"].items()
+        if "transcript" in data
+    }
+    transcript = transcripts[best_whisper]
+
+    # Benchmark Ollama models
+    print("\n" + "-"*40)
+    print("OLLAMA AD DETECTION BENCHMARKS")
+    print("-"*40)
+    results["ollama_benchmarks"] = benchmark_ad_detection(transcript)
+
+    # Full pipeline test with recommended config
+    print("\n" + "-"*40)
+    print("FULL PIPELINE TEST")
+    print("-"*40)
+
+    # Test with small+hermes3:8b (fast) and base+llama3.1:70b (quality)
+    configs = [
+        ("tiny", "hermes3:8b", "fast"),
+        ("base", "llama3.1:70b", "quality"),
+    ]
+
+    for whisper, ollama, label in configs:
+        print(f"\nTesting {label} config: whisper={whisper}, ollama={ollama}")
+        output_path = f"/tmp/benchmark_{label}_output.mp3"
+        start = time.time()
+        try:
+            stats = process_podcast(
+                audio_source=audio_path,
+                output_path=output_path,
+                whisper_model=whisper,
+                ollama_model=ollama
+            )
+            results["full_pipeline"][label] = {
+                "config": {"whisper": whisper, "ollama": ollama},
+                "total_time": stats["timings"]["total"],
+                "timings": stats["timings"],
+                "ads_found": len(stats["ad_segments"]),
+                "status": "success"
+            }
+        except Exception as e:
+            results["full_pipeline"][label] = {
+                "config": {"whisper": whisper, "ollama": ollama},
+                "status": "error",
+                "error": str(e)
+            }
 
     # Summary
     print("\n" + "="*60)
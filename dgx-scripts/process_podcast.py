@@ -13,39 +13,121 @@ import argparse
 import json
 import os
 import re
+import shutil
 import subprocess
 import sys
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
 
+import numpy as np
 import requests
 import torch
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Try OpenAI whisper (GPU support) first, fallback to faster-whisper
 try:
     import whisper
     USE_OPENAI_WHISPER = True
 except ImportError:
-    from faster_whisper import WhisperModel
+    from faster_whisper import WhisperModel, decode_audio
+    try:
+        # Batched inference is only available in faster-whisper >= 1.1
+        from faster_whisper import BatchedInferencePipeline
+    except ImportError:
+        BatchedInferencePipeline = None
     USE_OPENAI_WHISPER = False
 
+# Matches the JSON array of ad segments inside the LLM's free-form response
+JSON_ARRAY_PATTERN = re.compile(r'\[[\s\S]*\]')
+
+# Per-thread HTTP sessions. On the calling thread, the Ollama connection is reused
+# across chunks and across models in benchmark_ad_detection. Worker threads from
+# --ollama-workers get their own session (requests.Session is not guaranteed
+# thread-safe), and that session only lasts for one identify_ads_with_ollama call.
+_thread_local = threading.local()
+
+
+def get_http_session() -> requests.Session:
+    """Return this thread's HTTP session, creating it on first use."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+        })
+        # Connection errors are retried for every method, including POSTs to Ollama.
+        # Read errors and 5xx responses are retried for idempotent methods (GET) only.
+        retry_adapter = HTTPAdapter(
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(500, 502, 503, 504),
+                raise_on_status=False  # leave the final error to raise_for_status()
+            )
+        )
+        session.mount("http://", retry_adapter)
+        session.mount("https://", retry_adapter)
+        _thread_local.session = session
+    return session
+
+
+# Prompt templates for ad detection, built once at import and filled per chunk
+PODCAST_CONTEXT_TEMPLATE = """
+PODCAST CONTEXT (use this to distinguish show content from ads):
+- Show: {title}
+- Description: {description}
+- Typical topics: Content related to the show description is NOT an ad.
+- Ads are promotional content for EXTERNAL products/services, not the show itself.
+
+"""
+
+AD_DETECTION_PROMPT = """You are an expert at identifying advertisements in podcast transcripts.
+{context_section}
+Analyze this podcast transcript and identify all advertising segments. Ads typically include:
+- Sponsor reads ("This episode is brought to you by...", "Thanks to our sponsor...")
+- Promo codes and discount offers
+- Product pitches and calls to action for EXTERNAL products (not the podcast itself)
+- Mid-roll ad breaks (often introduced with "We'll be right back" or similar)
+- Mentions of visiting sponsor websites or using coupon codes
+- Pre-roll ads at the very START of the episode (before any show content)
+
+IMPORTANT: Podcasts often start DIRECTLY with an ad before any intro music or host greeting.
+Look for phrases like "This episode is brought to you by..." at timestamp 0:00.
+
+NOT ADS (keep these):
+- Intro/outro music and show theme songs
+- Host introductions and episode previews
+- Mentions of the podcast's own Patreon, merch, or upcoming episodes
+- Listener questions and show segments
+
+IMPORTANT: Return ONLY a valid JSON array of ad segments. Each segment should have "start" and "end" times in seconds.
+If no ads are found, return an empty array: []
+
+Example output format:
+[{{"start": 125.5, "end": 187.2}}, {{"start": 542.0, "end": 610.5}}]
+
+TRANSCRIPT:
+{transcript}
+
+JSON RESPONSE (ad segments only):"""
+
 
 def download_audio(url: str, output_path: str) -> str:
     """Download audio file from URL."""
     print(f"Downloading: {url}")
     start = time.time()
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-    }
-    response = requests.get(url, stream=True, timeout=300, headers=headers)
-    response.raise_for_status()
-
-    with open(output_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    with get_http_session().get(url, stream=True, timeout=300) as response:
+        response.raise_for_status()
+        # Copy straight from the socket in 1MB reads instead of 8KB chunks
+        response.raw.decode_content = True
+        with open(output_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=1024 * 1024)
 
     elapsed = time.time() - start
     size_mb = os.path.getsize(output_path) / (1024 * 1024)
@@ -53,20 +135,53 @@ def download_audio(url: str, output_path: str) -> str:
     return output_path
 
 
-def transcribe_audio(audio_path: str, whisper_model: str = "base") -> list[dict]:
+def load_whisper_model(whisper_model: str = "base"):
+    """Load a whisper model on the GPU if available, falling back to CPU."""
+    if USE_OPENAI_WHISPER:
+        # OpenAI whisper with GPU support
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"Using OpenAI whisper on {device.upper()}")
+        model = whisper.load_model(whisper_model, device=device)
+    else:
+        # Faster-whisper fallback
+        try:
+            model = WhisperModel(whisper_model, device="cuda", compute_type="int8_float16")
+            print("Using faster-whisper with CUDA (int8_float16)")
+        except ValueError:
+            # GPUs without INT8 kernels reject int8_float16; plain float16 still runs there
+            try:
+                model = WhisperModel(whisper_model, device="cuda", compute_type="float16")
+                print("Using faster-whisper with CUDA (float16)")
+            except ValueError:
+                print("CUDA not available, using CPU (this will be slower)")
+                model = WhisperModel(whisper_model, device="cpu", compute_type="int8")
+
+    return model
+
+
+def load_audio(audio_path: str) -> np.ndarray:
+    """
+    Decode audio to the 16kHz mono float32 waveform whisper expects.
+    Decode once and pass the array to transcribe_audio to skip repeated ffmpeg runs.
+    """
+    if USE_OPENAI_WHISPER:
+        return whisper.load_audio(audio_path)
+    return decode_audio(audio_path)
+
+
+def transcribe_audio(audio: Union[str, np.ndarray], whisper_model: str = "base") -> list[dict]:
     """
     Transcribe audio using OpenAI whisper (with GPU) or faster-whisper (CPU fallback).
+    audio is a file path or a waveform already decoded with load_audio.
     Returns list of segments with start, end, and text.
     """
     print(f"Transcribing with whisper model: {whisper_model}")
     start = time.time()
 
+    model = load_whisper_model(whisper_model)
+
     if USE_OPENAI_WHISPER:
-        # OpenAI whisper with GPU support
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Using OpenAI whisper on {device.upper()}")
-        model = whisper.load_model(whisper_model, device=device)
-        result = model.transcribe(audio_path, language="en")
+        result = model.transcribe(audio, language="en")
 
         transcript = []
         for segment in result["segments"]:
@@ -76,15 +191,20 @@ def transcribe_audio(audio_path: str, whisper_model: str = "base") -> list[dict]
                 "text": segment["text"].strip()
             })
     else:
-        # Faster-whisper fallback
-        try:
-            model = WhisperModel(whisper_model, device="cuda", compute_type="float16")
-            print("Using faster-whisper with CUDA")
-        except ValueError:
-            print("CUDA not available, using CPU (this will be slower)")
-            model = WhisperModel(whisper_model, device="cpu", compute_type="int8")
-
-        segments, info = model.transcribe(audio_path, beam_size=5, word_timestamps=True)
+        if BatchedInferencePipeline is not None:
+            # Split on speech with VAD and decode the chunks in batches.
+            # Keep timestamp tokens so segments stay sentence-level rather than
+            # one per (up to 30s) VAD chunk; ad cut points depend on them.
+            pipeline = BatchedInferencePipeline(model=model)
+            segments, info = pipeline.transcribe(
+                audio, beam_size=5, word_timestamps=True, batch_size=16,
+                without_timestamps=False
+            )
+        else:
+            segments, info = model.transcribe(
+                audio, beam_size=5, word_timestamps=True,
+                vad_filter=True, vad_parameters=dict(min_silence_duration_ms=500)
+            )
 
         transcript = []
         for segment in segments:
@@ -147,51 +267,21 @@ def analyze_chunk_for_ads(
     # Build context section if podcast info provided
     context_section = ""
     if podcast_context:
-        context_section = f"""
-PODCAST CONTEXT (use this to distinguish show content from ads):
-- Show: {podcast_context.get('title', 'Unknown')}
-- Description: {podcast_context.get('description', 'No description')}
-- Typical topics: Content related to the show description is NOT an ad.
-- Ads are promotional content for EXTERNAL products/services, not the show itself.
-
-"""
-
-    prompt = f"""You are an expert at identifying advertisements in podcast transcripts.
-{context_section}
-Analyze this podcast transcript and identify all advertising segments. Ads typically include:
-- Sponsor reads ("This episode is brought to you by...", "Thanks to our sponsor...")
-- Promo codes and discount offers
-- Product pitches and calls to action for EXTERNAL products (not the podcast itself)
-- Mid-roll ad breaks (often introduced with "We'll be right back" or similar)
-- Mentions of visiting sponsor websites or using coupon codes
-- Pre-roll ads at the very START of the episode (before any show content)
-
-IMPORTANT: Podcasts often start DIRECTLY with an ad before any intro music or host greeting.
-Look for phrases like "This episode is brought to you by..." at timestamp 0:00.
-
-NOT ADS (keep these):
-- Intro/outro music and show theme songs
-- Host introductions and episode previews
-- Mentions of the podcast's own Patreon, merch, or upcoming episodes
-- Listener questions and show segments
-
-IMPORTANT: Return ONLY a valid JSON array of ad segments. Each segment should have "start" and "end" times in seconds.
-If no ads are found, return an empty array: []
-
-Example output format:
-[{{"start": 125.5, "end": 187.2}}, {{"start": 542.0, "end": 610.5}}]
-
-TRANSCRIPT:
-{formatted}
+        context_section = PODCAST_CONTEXT_TEMPLATE.format(
+            title=podcast_context.get('title', 'Unknown'),
+            description=podcast_context.get('description', 'No description')
+        )
 
-JSON RESPONSE (ad segments only):"""
+    prompt = AD_DETECTION_PROMPT.format(context_section=context_section, transcript=formatted)
 
-    response = requests.post(
+    response = get_http_session().post(
         f"{ollama_host}/api/generate",
         json={
             "model": model,
             "prompt": prompt,
             "stream": False,
+            # Skip reasoning tokens on thinking models; only the JSON answer is used
+            "think": False,
             "options": {
                 "temperature": 0.1,
                 "num_predict": 1024
@@ -205,7 +295,7 @@ JSON RESPONSE (ad segments only):"""
     llm_response = result.get("response", "[]")
 
     # Extract JSON from response
-    json_match = re.search(r'\[[\s\S]*\]', llm_response)
+    json_match = JSON_ARRAY_PATTERN.search(llm_response)
     if json_match:
         try:
             ad_segments = json.loads(json_match.group())
@@ -240,11 +330,15 @@ def identify_ads_with_ollama(
     model: str = "qwen3-coder:latest",
     ollama_host: str = "http://localhost:11434",
     chunk_duration: float = 300.0,
-    podcast_context: Optional[dict] = None
+    podcast_context: Optional[dict] = None,
+    max_workers: int = 1
 ) -> list[dict]:
     """
     Use Ollama to identify ad segments in transcript.
     Chunks transcript into smaller pieces to avoid overwhelming the model.
+    With max_workers > 1, chunks are sent concurrently. This only helps if
+    Ollama is configured to serve several requests at once (OLLAMA_NUM_PARALLEL);
+    otherwise queued requests wait their turn and count against the request timeout.
 
     Args:
         transcript: List of {start, end, text} dicts
@@ -253,6 +347,7 @@ def identify_ads_with_ollama(
         chunk_duration: Seconds per chunk (default 5 min)
         podcast_context: Optional dict with 'title' and 'description' to help
                         distinguish show content from ads
+        max_workers: Maximum number of chunk requests in flight at once (default 1, serial)
 
     Returns list of {start, end} dicts for ad segments.
     """
@@ -265,16 +360,28 @@ def identify_ads_with_ollama(
     chunks = chunk_transcript(transcript, chunk_duration)
     print(f"Split transcript into {len(chunks)} chunks of ~{chunk_duration/60:.0f} min each")
 
-    all_ads = []
-    for i, chunk in enumerate(chunks):
+    def analyze(i: int, chunk: list[dict]) -> list[dict]:
         chunk_start = chunk[0]["start"] if chunk else 0
         chunk_end = chunk[-1]["end"] if chunk else 0
         print(f"  Analyzing chunk {i+1}/{len(chunks)} ({chunk_start:.0f}s - {chunk_end:.0f}s)...")
-
-        chunk_ads = analyze_chunk_for_ads(chunk, model, ollama_host, podcast_context)
-        if chunk_ads:
-            print(f"    Found {len(chunk_ads)} ads in chunk")
-            all_ads.extend(chunk_ads)
+        return analyze_chunk_for_ads(chunk, model, ollama_host, podcast_context)
+
+    def collect(results) -> list[dict]:
+        ads = []
+        for i, chunk_ads in enumerate(results):
+            if chunk_ads:
+                print(f"    Found {len(chunk_ads)} ads in chunk {i+1}")
+                ads.extend(chunk_ads)
+        return ads
+
+    if max_workers <= 1:
+        # Serial on the calling thread, so failures and Ctrl-C surface immediately
+        all_ads = collect(map(analyze, range(len(chunks)), chunks))
+    else:
+        # Requests are I/O-bound waits on Ollama, so overlap them across threads.
+        # map() yields results in chunk order regardless of completion order.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            all_ads = collect(executor.map(analyze, range(len(chunks)), chunks))
 
     elapsed = time.time() - start
     print(f"Found {len(all_ads)} total ad segments in {elapsed:.1f}s")
@@ -453,7 +560,8 @@ def process_podcast(
     whisper_model: str = "base",
     ollama_model: str = "llama3.1:70b",
     keep_intermediate: bool = False,
-    podcast_context: Optional[dict] = None
+    podcast_context: Optional[dict] = None,
+    ollama_workers: int = 1
 ) -> dict:
     """
     Main pipeline: download, transcribe, identify ads, remove ads.
@@ -466,6 +574,7 @@ def process_podcast(
         keep_intermediate: Keep temp files after processing
         podcast_context: Optional dict with 'title' and 'description' to help
                         distinguish show content from ads
+        ollama_workers: Maximum concurrent Ollama requests during ad detection
 
     Returns dict with timing stats and results.
     """
@@ -503,7 +612,8 @@ def process_podcast(
         ad_segments = identify_ads_with_ollama(
             transcript,
             ollama_model,
-            podcast_context=podcast_context
+            podcast_context=podcast_context,
+            max_workers=ollama_workers
         )
         stats["timings"]["ad_detection"] = time.time() - t0
         stats["ad_segments"] = ad_segments
@@ -558,6 +668,9 @@ def main():
                         help="Podcast title to help distinguish show content from ads")
     parser.add_argument("--podcast-description", "-d",
                         help="Podcast description to help identify show topics vs ads")
+    parser.add_argument("--ollama-workers", type=int, default=1,
+                        help="Maximum concurrent Ollama requests; raise only if Ollama "
+                             "serves requests in parallel (OLLAMA_NUM_PARALLEL) (default: 1)")
 
     args = parser.parse_args()
 
@@ -575,7 +688,8 @@ def main():
         whisper_model=args.whisper_model,
         ollama_model=args.ollama_model,
         keep_intermediate=args.keep_intermediate,
-        podcast_context=podcast_context
+        podcast_context=podcast_context,
+        ollama_workers=args.ollama_workers
     )
 
     print_stats(stats)